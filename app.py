@@ -3,6 +3,7 @@ from kiteconnect import KiteConnect
 import os
 from dotenv import load_dotenv
 from utils.file_utils import read_from_file
+from utils.kite_utils import KITE_HTTP_POOL
 from routes.auth_routes import register_auth_routes
 from routes.trading_routes import register_trading_routes
 from routes.admin_routes import register_admin_routes
@@ -22,7 +23,8 @@ ACCESS_TOKEN = read_from_file("access_token.txt")
 if not API_KEY or not API_SECRET:
     raise ValueError("API_KEY and API_SECRET must be set in .env file")
 
-kite = KiteConnect(api_key=API_KEY)
+# Pooled keep-alive HTTPS session shared by all requests to the Kite API
+kite = KiteConnect(api_key=API_KEY, pool=KITE_HTTP_POOL)
 
 @app.route('/')
 def home():
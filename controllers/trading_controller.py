@@ -1,15 +1,65 @@
 from kiteconnect import KiteConnect
-from utils.file_utils import read_from_file
+from utils.file_utils import read_cached_file, dumps_json_line, load_json_file
+from utils.kite_utils import get_exchange_instruments
+from utils.time_utils import FIRST_CANDLE_MINUTE, TIME_EXIT_MINUTE, minute_of_day, format_trade_id
 from datetime import datetime, timedelta
 import csv
 import os
-import json
-import pandas as pd
-import talib
 import numpy as np
 
+def parse_kite_timestamp(value):
+    """Parse a 'YYYY-MM-DD HH:MM:SS[+05:30]' candle timestamp as a naive datetime"""
+    # fromisoformat is implemented in C and much cheaper than strptime for this fixed layout
+    return datetime.fromisoformat(value[:19])
+
+def format_kite_minute(value):
+    """Format a candle timestamp string as 'YYYY-MM-DD HH:MM' (sliced directly when already in Kite's layout)"""
+    if len(value) >= 19 and value[4] == '-' and value[10] == ' ' and value[13] == ':':
+        return value[:16]
+    return parse_kite_timestamp(value).strftime('%Y-%m-%d %H:%M')
+
+# Paper trades are appended as JSON lines (one trade per line) - O(1) per trade
+PAPER_TRADES_FILE = "paper_trades.jsonl"
+# Older versions rewrote a single JSON array here; it is imported into the .jsonl once
+LEGACY_PAPER_TRADES_FILE = "paper_trades.json"
+
+def migrate_legacy_paper_trades():
+    """Move trades from the old paper_trades.json array ahead of the JSON-lines log (run once at import)"""
+    if not os.path.exists(LEGACY_PAPER_TRADES_FILE):
+        return
+    
+    try:
+        legacy_trades = load_json_file(LEGACY_PAPER_TRADES_FILE)
+        if not isinstance(legacy_trades, list):
+            raise ValueError("expected a JSON array of trades")
+    except ValueError as e:
+        # Unreadable legacy file: set it aside rather than failing every paper trade
+        os.replace(LEGACY_PAPER_TRADES_FILE, f"{LEGACY_PAPER_TRADES_FILE}.corrupt")
+        print(f"Skipped importing {LEGACY_PAPER_TRADES_FILE} ({str(e)}), moved to {LEGACY_PAPER_TRADES_FILE}.corrupt")
+        return
+    
+    existing = b''
+    if os.path.exists(PAPER_TRADES_FILE):
+        with open(PAPER_TRADES_FILE, 'rb') as f:
+            existing = f.read()
+    
+    # Legacy trades are older than anything appended since, so they go first
+    tmp_file = f"{PAPER_TRADES_FILE}.tmp"
+    with open(tmp_file, 'wb') as f:
+        for trade in legacy_trades:
+            f.write(dumps_json_line(trade))
+        f.write(existing)
+    os.replace(tmp_file, PAPER_TRADES_FILE)
+    os.replace(LEGACY_PAPER_TRADES_FILE, f"{LEGACY_PAPER_TRADES_FILE}.migrated")
+
+# Once per process, before any request can append - never on the request path
+try:
+    migrate_legacy_paper_trades()
+except OSError as e:
+    print(f"Could not import {LEGACY_PAPER_TRADES_FILE}: {str(e)}")
+
 def holdings(kite):
-    access_token = read_from_file("access_token.txt")
+    access_token = read_cached_file("access_token.txt")
     if not access_token:
         return None, "Missing access token"
     
@@ -36,7 +86,7 @@ def get_instruments(kite, data=None):
     - exchange: Exchange code (e.g., 'NFO', 'MCX'). Defaults to 'NFO'
     - instrument_type: Instrument type (e.g., 'FUT', 'OPT'). Defaults to 'FUT'
     """
-    access_token = read_from_file("access_token.txt")
+    access_token = read_cached_file("access_token.txt")
     if not access_token:
         return None, "Missing access token"
     
@@ -49,7 +99,7 @@ def get_instruments(kite, data=None):
     
     try:
         # Get all instruments from specified exchange
-        instruments = kite.instruments(exchange)
+        instruments, _ = get_exchange_instruments(kite, exchange)
         
         # Filter for specified symbol and instrument type
         filtered_instruments = []
@@ -105,7 +155,7 @@ def historical_data_with_alerts(kite, data):
         except ValueError:
             return None, "Invalid to_date format. Use YYYY-MM-DD"
     
-    access_token = read_from_file("access_token.txt")
+    access_token = read_cached_file("access_token.txt")
     if not access_token:
         return None, "Missing access token"
 
@@ -129,18 +179,19 @@ def historical_data_with_alerts(kite, data):
     if not historical_data:
         return None, "No historical data found"
     
-    # Convert historical data to DataFrame and calculate RSI using TA-Lib
+    # Calculate RSI on historical closes using TA-Lib
     # TA-Lib RSI uses Wilder's smoothing method (standard 14-period RSI)
     # Formula: 
     # - First 14 candles: Simple average of gains/losses
     # - Later candles: Wilder's smoothing: AvgGain = (Previous AvgGain * 13 + Current Gain) / 14
     # - RS = AvgGain / AvgLoss
     # - RSI = 100 - (100 / (1 + RS))
-    df = pd.DataFrame(historical_data)
-    # Convert to numpy array and ensure float64 type (double) for TA-Lib
-    closes = np.array(df["close"].values, dtype=np.float64)
+    # Build float64 (double) close array for TA-Lib directly, without a DataFrame
+    closes = np.fromiter((c["close"] for c in historical_data), dtype=np.float64, count=len(historical_data))
     
     # Calculate RSI using TA-Lib (14-period, Wilder's smoothing)
+    # Imported lazily: TA-Lib is only needed by the RSI endpoints, not at app startup
+    import talib
     rsi_values = talib.RSI(closes, timeperiod=14)
     
     # Convert numpy array to list and handle NaN values (first 14 candles will be NaN)
@@ -184,8 +235,7 @@ def historical_data_with_alerts(kite, data):
                 if date_str:
                     try:
                         if isinstance(date_str, str):
-                            date_obj = datetime.strptime(date_str.split('+')[0].strip(), '%Y-%m-%d %H:%M:%S')
-                            date_simple = date_obj.strftime('%Y-%m-%d %H:%M')
+                            date_simple = format_kite_minute(date_str)
                         else:
                             date_simple = date_str.strftime('%Y-%m-%d %H:%M') if hasattr(date_str, 'strftime') else str(date_str)
                     except:
@@ -217,7 +267,7 @@ def start_paper_trade(kite, data):
     if transaction_type not in ["BUY", "SELL"]:
         return None, "transaction_type must be BUY or SELL"
     
-    access_token = read_from_file("access_token.txt")
+    access_token = read_cached_file("access_token.txt")
     if not access_token:
         return None, "Missing access token"
     
@@ -249,31 +299,22 @@ def start_paper_trade(kite, data):
         if price == 0:
             return None, "Invalid price"
         
+        now = datetime.now()
         paper_trade = {
-            "trade_id": f"PT_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}",
+            "trade_id": format_trade_id("PT", now),
             "instrument_token": instrument_token,
             "quantity": int(quantity),
             "transaction_type": transaction_type,
             "order_type": order_type,
             "product": product,
             "price": float(price),
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now.isoformat(),
             "status": "PAPER_TRADE_OPEN"
         }
         
-        filename = "paper_trades.json"
-        paper_trades = []
-        if os.path.exists(filename):
-            with open(filename, 'r') as f:
-                try:
-                    paper_trades = json.load(f)
-                except:
-                    paper_trades = []
-        
-        paper_trades.append(paper_trade)
-        
-        with open(filename, 'w') as f:
-            json.dump(paper_trades, f, indent=2)
+        # Append-only: no need to read and rewrite every previous paper trade
+        with open(PAPER_TRADES_FILE, 'ab') as f:
+            f.write(dumps_json_line(paper_trade))
         
         return paper_trade, None
     except Exception as e:
@@ -307,7 +348,7 @@ def backtest_strategy(kite, data):
         except ValueError:
             return None, "Invalid to_date format. Use YYYY-MM-DD"
     
-    access_token = read_from_file("access_token.txt")
+    access_token = read_cached_file("access_token.txt")
     if not access_token:
         return None, "Missing access token"
     
@@ -323,68 +364,55 @@ def backtest_strategy(kite, data):
     if not historical_data:
         return None, "No historical data found"
     
-    # Convert historical data to DataFrame and calculate RSI using TA-Lib
+    # Calculate RSI on historical closes using TA-Lib
     # TA-Lib RSI uses Wilder's smoothing method (standard 14-period RSI)
     # Formula: 
     # - First 14 candles: Simple average of gains/losses
     # - Later candles: Wilder's smoothing: AvgGain = (Previous AvgGain * 13 + Current Gain) / 14
     # - RS = AvgGain / AvgLoss
     # - RSI = 100 - (100 / (1 + RS))
-    df = pd.DataFrame(historical_data)
-    # Convert to numpy array and ensure float64 type (double) for TA-Lib
-    closes = np.array(df["close"].values, dtype=np.float64)
+    # Build float64 (double) close array for TA-Lib directly, without a DataFrame
+    closes = np.fromiter((c["close"] for c in historical_data), dtype=np.float64, count=len(historical_data))
     
     # Calculate RSI using TA-Lib (14-period, Wilder's smoothing)
+    # Imported lazily: TA-Lib is only needed by the RSI endpoints, not at app startup
+    import talib
     rsi_values = talib.RSI(closes, timeperiod=14)
     
     # Convert numpy array to list and handle NaN values (first 14 candles will be NaN)
     rsi_values = [float(val) if not np.isnan(val) else None for val in rsi_values]
     
-    def is_after_325(candle_date):
-        """Check if time is 3:25 PM or later (15:25)"""
-        if isinstance(candle_date, str):
-            try:
-                date_obj = datetime.strptime(candle_date.split('+')[0].strip(), '%Y-%m-%d %H:%M:%S')
-                return date_obj.hour > 15 or (date_obj.hour == 15 and date_obj.minute >= 25)
-            except:
-                return False
-        elif isinstance(candle_date, datetime):
-            return candle_date.hour > 15 or (candle_date.hour == 15 and candle_date.minute >= 25)
-        return False
-    
-    def should_allow_trading(candle_date):
-        """Check if trading is allowed (not after 3:25 PM)"""
-        return not is_after_325(candle_date)
-    
-    # Identify first candle of each trading day (9:15 AM IST - market opening)
+    # Single pass: identify first candle of each trading day (9:15 AM IST - market opening)
+    # and alert candles, using same logic as historical_data_with_alerts.
+    # Each candle's timestamp is parsed once here; its minute-of-day is reused by the trade loop.
     first_candle_of_day = set()
+    candle_minutes = [None] * len(historical_data)  # minute-of-day per candle (None if unparseable)
+    alert_candles = []
+    prev_rsi = None
+    
     for i, candle in enumerate(historical_data):
+        rsi = rsi_values[i] if i < len(rsi_values) else None
+        
         date_str = candle.get('date', '')
         if date_str:
             try:
                 if isinstance(date_str, str):
-                    date_obj = datetime.strptime(date_str.split('+')[0].strip(), '%Y-%m-%d %H:%M:%S')
+                    date_obj = parse_kite_timestamp(date_str)
                 else:
                     date_obj = date_str
                 
+                candle_minute = minute_of_day(date_obj)
+                candle_minutes[i] = candle_minute
+                
                 # Check if it's 9:15 AM (first candle of trading day)
                 # Market opens at 9:15 AM IST, so first 5-minute candle is 9:15-9:20
-                if date_obj.hour == 9 and date_obj.minute == 15:
+                if candle_minute == FIRST_CANDLE_MINUTE:
                     first_candle_of_day.add(i)
+                    # Skip first candle of day for alerts
+                    prev_rsi = rsi
+                    continue
             except:
                 pass
-    
-    # Identify alert candles using same logic as historical_data_with_alerts
-    alert_candles = []
-    prev_rsi = None
-    
-    for i, candle in enumerate(historical_data):
-        # Skip first candle of day
-        if i in first_candle_of_day:
-            prev_rsi = rsi_values[i] if i < len(rsi_values) else None
-            continue
-        
-        rsi = rsi_values[i] if i < len(rsi_values) else None
         
         if rsi is not None and prev_rsi is not None:
             crossed_60_up = prev_rsi <= 60 and rsi > 60
@@ -416,8 +444,11 @@ def backtest_strategy(kite, data):
         is_first_candle = i in first_candle_of_day
         
         # Check if time is 3:25 PM or later - exit any open trade
+        # Evaluated once per candle; trading is allowed only before 3:25 PM
         candle_date = candle.get('date', '')
-        if open_trade and is_after_325(candle_date):
+        candle_minute = candle_minutes[i]
+        after_325 = candle_minute is not None and candle_minute >= TIME_EXIT_MINUTE
+        if open_trade and after_325:
             # Force exit at 3:25 PM
             close = candle.get('close', 0)
             if close > 0:
@@ -437,72 +468,43 @@ def backtest_strategy(kite, data):
             high = candle.get('high', 0)
             low = candle.get('low', 0)
             close = candle.get('close', 0)
+            stop_loss = open_trade['stop_loss']
+            target = open_trade['target']
             
+            # BUY exits on low <= SL / high >= target, SELL on the mirror image
             if open_trade['type'] == 'BUY':
-                # Check for stop loss or target
-                if low <= open_trade['stop_loss']:
-                    # Stop loss hit
-                    open_trade['exit_price'] = open_trade['stop_loss']
-                    open_trade['exit_date'] = candle.get('date', '')
-                    open_trade['exit_index'] = i
-                    open_trade['pnl'] = open_trade['exit_price'] - open_trade['entry_price']
-                    open_trade['status'] = 'STOP_LOSS'
-                    trades.append(open_trade)
-                    open_trade = None
-                elif high >= open_trade['target']:
-                    # Target hit
-                    open_trade['exit_price'] = open_trade['target']
-                    open_trade['exit_date'] = candle.get('date', '')
-                    open_trade['exit_index'] = i
-                    open_trade['pnl'] = open_trade['exit_price'] - open_trade['entry_price']
-                    open_trade['status'] = 'TARGET'
-                    trades.append(open_trade)
-                    open_trade = None
-                elif i == len(historical_data) - 1:
-                    # Last candle, exit at close
-                    open_trade['exit_price'] = close
-                    open_trade['exit_date'] = candle.get('date', '')
-                    open_trade['exit_index'] = i
-                    open_trade['pnl'] = open_trade['exit_price'] - open_trade['entry_price']
-                    open_trade['status'] = 'EXIT_END_OF_DATA'
-                    trades.append(open_trade)
-                    open_trade = None
+                sl_hit, target_hit = low <= stop_loss, high >= target
+            else:
+                sl_hit, target_hit = high >= stop_loss, low <= target
             
-            elif open_trade['type'] == 'SELL':
-                # Check for stop loss or target
-                if high >= open_trade['stop_loss']:
-                    # Stop loss hit
-                    open_trade['exit_price'] = open_trade['stop_loss']
-                    open_trade['exit_date'] = candle.get('date', '')
-                    open_trade['exit_index'] = i
-                    open_trade['pnl'] = open_trade['entry_price'] - open_trade['exit_price']
-                    open_trade['status'] = 'STOP_LOSS'
-                    trades.append(open_trade)
-                    open_trade = None
-                elif low <= open_trade['target']:
-                    # Target hit
-                    open_trade['exit_price'] = open_trade['target']
-                    open_trade['exit_date'] = candle.get('date', '')
-                    open_trade['exit_index'] = i
-                    open_trade['pnl'] = open_trade['entry_price'] - open_trade['exit_price']
-                    open_trade['status'] = 'TARGET'
-                    trades.append(open_trade)
-                    open_trade = None
-                elif i == len(historical_data) - 1:
-                    # Last candle, exit at close
-                    open_trade['exit_price'] = close
-                    open_trade['exit_date'] = candle.get('date', '')
-                    open_trade['exit_index'] = i
-                    open_trade['pnl'] = open_trade['entry_price'] - open_trade['exit_price']
-                    open_trade['status'] = 'EXIT_END_OF_DATA'
-                    trades.append(open_trade)
-                    open_trade = None
+            exit_status = None
+            if sl_hit:
+                # Stop loss hit
+                exit_price, exit_status = stop_loss, 'STOP_LOSS'
+            elif target_hit:
+                # Target hit
+                exit_price, exit_status = target, 'TARGET'
+            elif i == len(historical_data) - 1:
+                # Last candle, exit at close
+                exit_price, exit_status = close, 'EXIT_END_OF_DATA'
+            
+            if exit_status:
+                open_trade['exit_price'] = exit_price
+                open_trade['exit_date'] = candle.get('date', '')
+                open_trade['exit_index'] = i
+                if open_trade['type'] == 'BUY':
+                    open_trade['pnl'] = exit_price - open_trade['entry_price']
+                else:
+                    open_trade['pnl'] = open_trade['entry_price'] - exit_price
+                open_trade['status'] = exit_status
+                trades.append(open_trade)
+                open_trade = None
         
         # Check for entry from pending alerts (alert was on previous candle)
         # We stored alerts with their index as key, so check if previous candle index exists
         # Only allow entry if trading is allowed (not after 3:25 PM)
         prev_candle_idx = i - 1
-        if not open_trade and not is_first_candle and prev_candle_idx in pending_alerts and should_allow_trading(candle_date):
+        if not open_trade and not is_first_candle and prev_candle_idx in pending_alerts and not after_325:
             alert = pending_alerts[prev_candle_idx]
             high = candle.get('high', 0)
             low = candle.get('low', 0)
@@ -550,7 +552,7 @@ def backtest_strategy(kite, data):
                     del pending_alerts[prev_candle_idx]
         
         # Check for new alert candles (only if trading is allowed - not after 3:25 PM)
-        if should_allow_trading(candle_date):
+        if not after_325:
             for alert in alert_candles:
                 if alert['index'] == i and not is_first_candle:
                     # Check if range condition is met (high - low < 40)
@@ -582,8 +584,7 @@ def backtest_strategy(kite, data):
             if trade.get('alert_date'):
                 try:
                     if isinstance(trade['alert_date'], str):
-                        alert_date_obj = datetime.strptime(trade['alert_date'].split('+')[0].strip(), '%Y-%m-%d %H:%M:%S')
-                        alert_date_str = alert_date_obj.strftime('%Y-%m-%d %H:%M')
+                        alert_date_str = format_kite_minute(trade['alert_date'])
                     else:
                         alert_date_str = trade['alert_date'].strftime('%Y-%m-%d %H:%M') if hasattr(trade['alert_date'], 'strftime') else str(trade['alert_date'])
                 except:
@@ -592,8 +593,7 @@ def backtest_strategy(kite, data):
             if trade.get('entry_date'):
                 try:
                     if isinstance(trade['entry_date'], str):
-                        entry_date_obj = datetime.strptime(trade['entry_date'].split('+')[0].strip(), '%Y-%m-%d %H:%M:%S')
-                        entry_date_str = entry_date_obj.strftime('%Y-%m-%d %H:%M')
+                        entry_date_str = format_kite_minute(trade['entry_date'])
                     else:
                         entry_date_str = trade['entry_date'].strftime('%Y-%m-%d %H:%M') if hasattr(trade['entry_date'], 'strftime') else str(trade['entry_date'])
                 except:
@@ -602,8 +602,7 @@ def backtest_strategy(kite, data):
             if trade.get('exit_date'):
                 try:
                     if isinstance(trade['exit_date'], str):
-                        exit_date_obj = datetime.strptime(trade['exit_date'].split('+')[0].strip(), '%Y-%m-%d %H:%M:%S')
-                        exit_date_str = exit_date_obj.strftime('%Y-%m-%d %H:%M')
+                        exit_date_str = format_kite_minute(trade['exit_date'])
                     else:
                         exit_date_str = trade['exit_date'].strftime('%Y-%m-%d %H:%M') if hasattr(trade['exit_date'], 'strftime') else str(trade['exit_date'])
                 except:
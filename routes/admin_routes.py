@@ -1,15 +1,42 @@
 from flask import render_template, request, redirect, session, jsonify
 import json
 import os
+import mmap
 
 ADMIN_PASSWORD = "admin123"
 CONFIG_FILE = "config.json"
 LOG_FILE = "websocket_server.log"
+LOG_TAIL_LINES = 200
 
 
 def save_config(data):
+    payload = json.dumps(data, indent=4)
     with open(CONFIG_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+        f.write(payload)
+
+
+def read_log_tail(filename, max_lines):
+    """Return (last max_lines lines, total line count) using a memory map - no full-file copy"""
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return '', 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            # Walk back from the end to the start of the last max_lines lines
+            end = size - 1 if mm[size - 1:size] == b'\n' else size
+            start = end
+            for _ in range(max_lines):
+                start = mm.rfind(b'\n', 0, start)
+                if start == -1:
+                    break
+            start += 1
+            tail = mm[start:size].decode('utf-8', errors='ignore')
+            # Count lines in fixed-size slices so memory stays bounded on large logs
+            chunk = 1 << 20
+            total_lines = sum(mm[i:i + chunk].count(b'\n') for i in range(0, size, chunk))
+            if end == size:
+                total_lines += 1  # last line has no trailing newline
+    return tail, total_lines
 
 
 def load_config():
@@ -81,15 +108,12 @@ def register_admin_routes(app):
                 })
             
             # Read last 200 lines of CURRENT log file for better scrolling experience
-            with open(LOG_FILE, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-                last_lines = lines[-200:] if len(lines) > 200 else lines
-                log_content = ''.join(last_lines)
+            log_content, total_lines = read_log_tail(LOG_FILE, LOG_TAIL_LINES)
                 
             return jsonify({
                 "logs": log_content,
-                "lines": len(last_lines),
-                "total_lines": len(lines)
+                "lines": min(total_lines, LOG_TAIL_LINES),
+                "total_lines": total_lines
             })
         except Exception as e:
             return jsonify({"error": str(e), "logs": "Error reading logs"}), 500
\ No newline at end of file
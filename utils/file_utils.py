@@ -1,8 +1,54 @@
+import os
+import json
+
+# Use orjson for candle/trade serialization when available (C extension, emits bytes directly)
+try:
+    import orjson
+    ORJSON_ENABLED = True
+except ImportError:
+    ORJSON_ENABLED = False
+
+# filename -> ((st_mtime_ns, st_size), content)
+_file_cache = {}
+
 def read_from_file(filename):
     with open(filename, 'r') as file:
         return file.read().strip()
 
+def read_cached_file(filename):
+    """Read a small file, reusing the cached content until it changes on disk"""
+    stat = os.stat(filename)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _file_cache.get(filename)
+    if cached and cached[0] == key:
+        return cached[1]
+    content = read_from_file(filename)
+    _file_cache[filename] = (key, content)
+    return content
+
 def write_to_file(filename, content):
     with open(filename, 'w') as file:
         file.write(content)
 
+def dumps_json(obj):
+    """Serialize to indented JSON bytes, using orjson when installed"""
+    if ORJSON_ENABLED:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, indent=2).encode('utf-8')
+
+def dumps_json_line(obj):
+    """Serialize to a compact, newline-terminated JSON line (bytes) for append-only logs"""
+    if ORJSON_ENABLED:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj) + '\n').encode('utf-8')
+
+def loads_json(data):
+    """Parse JSON from bytes or str, using orjson when installed"""
+    if ORJSON_ENABLED:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def load_json_file(filename):
+    """Read and parse a JSON file as bytes, using orjson when installed"""
+    with open(filename, 'rb') as f:
+        return loads_json(f.read())
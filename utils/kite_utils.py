@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+# HTTPS connection pool for KiteConnect's requests session (passed to HTTPAdapter)
+# Shared by the Flask app and the trading server
+KITE_HTTP_POOL = {"pool_connections": 4, "pool_maxsize": 16}
+
+# Kite regenerates the instruments dump around 08:30 each morning
+INSTRUMENTS_REFRESH_MINUTE = 8 * 60 + 30
+
+# exchange -> (fetched_at, instruments, {tradingsymbol: instrument})
+_instruments_cache = {}
+
+def last_instruments_refresh(now):
+    """Most recent dump regeneration: today 08:30, or yesterday's if it's still earlier than that"""
+    refreshed_at = now.replace(hour=INSTRUMENTS_REFRESH_MINUTE // 60, minute=INSTRUMENTS_REFRESH_MINUTE % 60,
+                               second=0, microsecond=0)
+    if now < refreshed_at:
+        refreshed_at -= timedelta(days=1)
+    return refreshed_at
+
+def get_exchange_instruments(kite, exchange):
+    """
+    Return (instruments, by_tradingsymbol) for an exchange, cached until Kite's next dump.
+    The instruments dump is thousands of rows and is regenerated once each morning,
+    so requests, reconnects and config changes reuse it instead of downloading it again.
+    """
+    now = datetime.now()
+    cached = _instruments_cache.get(exchange)
+    if cached and cached[0] >= last_instruments_refresh(now):
+        return cached[1], cached[2]
+    
+    instruments = kite.instruments(exchange)
+    by_symbol = {inst.get('tradingsymbol', '').strip().upper(): inst for inst in instruments}
+    _instruments_cache[exchange] = (now, instruments, by_symbol)
+    return instruments, by_symbol
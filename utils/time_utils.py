@@ -0,0 +1,12 @@
+# Session times as minute-of-day (hour * 60 + minute) for single integer comparisons
+# Shared by the backtest and the live trading server
+FIRST_CANDLE_MINUTE = 9 * 60 + 15   # 9:15 AM - first 5-minute candle of the day
+TIME_EXIT_MINUTE = 15 * 60 + 25     # 3:25 PM - no new trades, force exit of open trades
+
+def minute_of_day(dt):
+    return dt.hour * 60 + dt.minute
+
+def format_trade_id(prefix, dt):
+    """Build a PREFIX_YYYYmmdd_HHMMSS_ffffff trade id with integer formatting instead of strftime"""
+    return (f"{prefix}_{dt.year:04d}{dt.month:02d}{dt.day:02d}_"
+            f"{dt.hour:02d}{dt.minute:02d}{dt.second:02d}_{dt.microsecond:06d}")
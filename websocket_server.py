@@ -14,16 +14,26 @@ Run: python websocket_server.py
 import os
 import sys
 import time
+import random
+import signal
+import socket
 import json
+import hashlib
 import logging
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
+import atexit
 from datetime import datetime, timedelta
+from dataclasses import dataclass
 from kiteconnect import KiteConnect, KiteTicker
+from twisted.internet import reactor
 from dotenv import load_dotenv
-import pandas as pd
 import talib
 import numpy as np
 import threading
+import queue
+from utils.file_utils import dumps_json, load_json_file
+from utils.kite_utils import KITE_HTTP_POOL, get_exchange_instruments
+from utils.time_utils import FIRST_CANDLE_MINUTE, TIME_EXIT_MINUTE, minute_of_day, format_trade_id
 
 def read_from_file(filename):
     """Read content from a file"""
@@ -33,6 +43,19 @@ def read_from_file(filename):
     except FileNotFoundError:
         return None
 
+def write_file_atomic(filename, payload):
+    """Write bytes via a temp file + os.replace so a crash never leaves a truncated file"""
+    tmp_file = filename + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        # Data only - the file's metadata (mtime etc.) doesn't need to hit disk before the rename
+        if hasattr(os, 'fdatasync'):
+            os.fdatasync(f.fileno())
+        else:
+            os.fsync(f.fileno())
+    os.replace(tmp_file, filename)
+
 # Import email utilities for trade notifications
 try:
     sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -63,9 +86,23 @@ file_handler.setFormatter(formatter)
 console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setFormatter(formatter)
 
+# Callers only enqueue records; a single listener thread does the file/console writes,
+# so a slow disk or stdout never stalls the tick worker or the main loop
+log_queue = queue.Queue(-1)
+log_listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)  # drain queued records on exit
+
 # Add handlers to logger
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+logger.addHandler(QueueHandler(log_queue))
+
+@dataclass(slots=True)
+class OpenTradeLevels:
+    """Exit levels of the open trade, read on every tick (slot attributes instead of dict lookups)"""
+    direction: int  # +1 for BUY, -1 for SELL
+    stop_loss: float
+    target: float
+
 
 class KiteDataFetcher:
     def __init__(self):
@@ -90,8 +127,11 @@ class KiteDataFetcher:
         self.kite = None
         self.kws = None  # KiteTicker WebSocket
         self.access_token = None
+        self.access_token_stat = None  # (mtime_ns, size) of access_token.txt when last read
         self.is_connected = False
         self.ws_connected = False
+        self.ws_connected_event = threading.Event()  # Set by on_connect, lets setup_websocket wait without a fixed sleep
+        self.ws_lock = threading.Lock()  # Guards creating/closing self.kws
         
         # Configuration files
         self.config_file = "config.json"
@@ -99,6 +139,8 @@ class KiteDataFetcher:
         
         # Configuration
         self.retry_interval = 300  # 5 minutes in seconds
+        self.retry_attempt = 0  # Consecutive failed connects - drives the jittered backoff below retry_interval
+        self.retry_base_delay = 5  # First retry waits 2.5-5s; doubles per consecutive failure up to retry_interval
         self.fetch_interval = 300  # 5 minutes in seconds
         self.candle_processing_delay = 10  # Wait 10 seconds after interval (configurable)
         self.candles_data_file = "candles_data.json"
@@ -120,16 +162,33 @@ class KiteDataFetcher:
         
         # Instrument will be fetched dynamically from API based on symbol
         self.instrument_token = None
+        self.instrument_token_int = None  # Integer token, parsed once per instrument for the tick path
         self.instrument_name = None
         self.tradingsymbol = None
         
         # Trading state
         self.previous_rsi = None
         self.open_trade = None  # Track current open trade
+        self.open_trade_levels = None  # OpenTradeLevels of open_trade, used by the tick path
+        self.trade_lock = threading.Lock()  # Guards open_trade/alert_candle transitions (tick worker vs main loop)
+        self.last_candles_hash = None  # blake2b digest of the last candles_data.json payload written
         self.alert_candle = None  # Store alert candle waiting for entry on next candle
+        self.instrument_generation = 0  # Bumped on instrument change; alerts record the one they were marked under
         self.last_tick_price = None  # Last price from WebSocket
         self.first_candle_time = None  # Track first candle of the day (9:15 AM)
         
+        # Tick processing - WebSocket thread only enqueues per-packet price lists, worker thread runs entry/exit checks
+        self.tick_queue = queue.Queue(maxsize=4096)
+        self.tick_worker = None
+        self.dropped_ticks = 0  # Ticks dropped because the queue was full (reported by main loop)
+        
+        # Trade emails are sent by a background worker so SMTP never blocks trading
+        self.notification_queue = queue.Queue(maxsize=256)  # Bounded - a dead mail server can't grow it forever
+        self.notification_worker = None
+        
+        # Set by SIGTERM/SIGINT handler - main loop waits on it instead of sleeping
+        self.shutdown_event = threading.Event()
+        
         logger.info(f"📊 Trading Mode: {self.trading_enabled.upper()}")
         logger.info(f"📦 Trade Quantity: {self.trading_lots} lot(s)")
         logger.info(f"🔄 Retry Interval: {self.retry_interval} seconds")
@@ -230,8 +289,9 @@ class KiteDataFetcher:
             
             config['is_changed'] = False
             
+            payload = json.dumps(config, indent=4)
             with open(self.config_file, 'w') as f:
-                json.dump(config, f, indent=4)
+                f.write(payload)
             
             logger.info("✓ Config 'is_changed' flag reset to false")
             return True
@@ -280,16 +340,20 @@ class KiteDataFetcher:
                 
                 # Clear alert and open trade from previous instrument
                 logger.info("🧹 Clearing alert candle and open trades from previous instrument...")
-                self.alert_candle = None
-                self.open_trade = None
+                with self.trade_lock:
+                    dropped_trade = self.open_trade
+                    self.alert_candle = None
+                    self.set_open_trade(None)
+                    self.instrument_generation += 1
+                if dropped_trade:
+                    self.flag_untracked_trade(dropped_trade, "Instrument changed in config")
+                
+                # Close existing WebSocket (also stops its auto-reconnect)
+                with self.ws_lock:
+                    self.close_websocket()
                 
-                # Close existing WebSocket if connected
-                if self.ws_connected and self.kws:
-                    try:
-                        self.kws.close()
-                        logger.info("✓ Closed existing WebSocket connection")
-                    except:
-                        pass
+                # Drop prices still queued for the previous instrument
+                self.clear_tick_queue()
                 
                 # Fetch new instrument
                 if self.instrument_type == 'FUT':
@@ -341,6 +405,12 @@ class KiteDataFetcher:
             self.is_config_change = False
             return (False, False)
     
+    def get_exchange_instruments(self, exchange):
+        """Return (instruments, by_tradingsymbol) for an exchange from the shared daily-dump cache"""
+        instruments, by_symbol = get_exchange_instruments(self.kite, exchange)
+        logger.info(f"Loaded {len(instruments)} {exchange} instruments (cached until next dump refresh)")
+        return instruments, by_symbol
+    
     def get_current_month_futures(self):
         """
         Fetch current month futures instrument token for the configured symbol
@@ -348,33 +418,34 @@ class KiteDataFetcher:
         """
         try:
             logger.info(f"Fetching {self.instrument_symbol} futures instruments...")
-            instruments = self.kite.instruments(self.exchange)
+            instruments, _ = self.get_exchange_instruments(self.exchange)
+            
+            # Filter for specified symbol futures and keep only the nearest expiry in one pass -
+            # no list of every contract, no full sort (cheap instrument_type check first)
+            # Expired contracts are skipped in case the dump predates today's expiry roll
+            today = datetime.now().date()
+            futures = (
+                inst for inst in instruments
+                if inst.get('instrument_type', '') == 'FUT'
+                and inst.get('name', '').strip().upper() == self.instrument_symbol
+                and not (hasattr(inst.get('expiry'), 'year') and inst['expiry'] < today)
+            )
+            inst = min(futures, key=lambda x: x.get('expiry', ''), default=None)
             
-            # Filter for specified symbol futures only
-            futures = []
-            for inst in instruments:
-                name = inst.get('name', '').strip().upper()
-                instrument_type = inst.get('instrument_type', '')
-                
-                if name == self.instrument_symbol and instrument_type == 'FUT':
-                    futures.append({
-                        "instrument_token": inst.get('instrument_token'),
-                        "tradingsymbol": inst.get('tradingsymbol'),
-                        "name": inst.get('name'),
-                        "expiry": inst.get('expiry'),
-                        "exchange": inst.get('exchange')
-                    })
-            
-            # Sort by expiry (nearest first)
-            futures.sort(key=lambda x: x.get('expiry', ''))
-            
-            if not futures:
+            if inst is None:
                 logger.error(f"✗ No {self.instrument_symbol} futures found")
                 return None
             
-            # Get nearest expiry (current month)
-            nearest = futures[0]
+            # Nearest expiry (current month)
+            nearest = {
+                "instrument_token": inst.get('instrument_token'),
+                "tradingsymbol": inst.get('tradingsymbol'),
+                "name": inst.get('name'),
+                "expiry": inst.get('expiry'),
+                "exchange": inst.get('exchange')
+            }
             self.instrument_token = str(nearest['instrument_token'])
+            self.instrument_token_int = int(nearest['instrument_token'])
             self.instrument_name = f"{self.instrument_symbol} FUT {nearest['expiry'].strftime('%d-%b-%Y') if hasattr(nearest['expiry'], 'strftime') else nearest['expiry']}"
             self.tradingsymbol = nearest['tradingsymbol']
             
@@ -404,26 +475,26 @@ class KiteDataFetcher:
         """
         try:
             logger.info(f"Fetching option instrument: {self.instrument_symbol}...")
-            instruments = self.kite.instruments(self.exchange)
+            _, by_symbol = self.get_exchange_instruments(self.exchange)
             
-            # Search for exact match of trading symbol
-            for inst in instruments:
-                tradingsymbol = inst.get('tradingsymbol', '').strip().upper()
-                instrument_type = inst.get('instrument_type', '')
+            # Exact match of trading symbol (dict lookup instead of scanning the exchange dump)
+            inst = by_symbol.get(self.instrument_symbol)
+            instrument_type = inst.get('instrument_type', '') if inst else None
+            
+            if inst and instrument_type == self.instrument_type:
+                self.instrument_token = str(inst.get('instrument_token'))
+                self.instrument_token_int = int(inst.get('instrument_token'))
+                self.tradingsymbol = self.instrument_symbol
+                self.instrument_name = f"{inst.get('name')} {instrument_type} {inst.get('strike')} {inst.get('expiry').strftime('%d-%b-%Y') if hasattr(inst.get('expiry'), 'strftime') else inst.get('expiry')}"
                 
-                if tradingsymbol == self.instrument_symbol and instrument_type == self.instrument_type:
-                    self.instrument_token = str(inst.get('instrument_token'))
-                    self.tradingsymbol = tradingsymbol
-                    self.instrument_name = f"{inst.get('name')} {instrument_type} {inst.get('strike')} {inst.get('expiry').strftime('%d-%b-%Y') if hasattr(inst.get('expiry'), 'strftime') else inst.get('expiry')}"
-                    
-                    logger.info(f"✓ Selected Option: {self.tradingsymbol}")
-                    logger.info(f"  Instrument Token: {self.instrument_token}")
-                    logger.info(f"  Strike: {inst.get('strike')}")
-                    logger.info(f"  Expiry: {inst.get('expiry')}")
-                    logger.info(f"  Lot Size: {self.lot_size} units per lot")
-                    logger.info(f"  Trading: {self.trading_lots} lot(s) = {self.quantity} units")
-                    
-                    return inst
+                logger.info(f"✓ Selected Option: {self.tradingsymbol}")
+                logger.info(f"  Instrument Token: {self.instrument_token}")
+                logger.info(f"  Strike: {inst.get('strike')}")
+                logger.info(f"  Expiry: {inst.get('expiry')}")
+                logger.info(f"  Lot Size: {self.lot_size} units per lot")
+                logger.info(f"  Trading: {self.trading_lots} lot(s) = {self.quantity} units")
+                
+                return inst
             
             # If not found, log helpful message
             logger.error(f"✗ Option instrument not found: {self.instrument_symbol}")
@@ -448,25 +519,24 @@ class KiteDataFetcher:
         """
         try:
             logger.info(f"Fetching equity instrument: {self.instrument_symbol}...")
-            instruments = self.kite.instruments(self.exchange)
+            _, by_symbol = self.get_exchange_instruments(self.exchange)
             
-            # Search for equity instrument
-            for inst in instruments:
-                tradingsymbol = inst.get('tradingsymbol', '').strip().upper()
-                instrument_type = inst.get('instrument_type', '')
+            # Look up equity instrument by trading symbol
+            inst = by_symbol.get(self.instrument_symbol)
+            
+            if inst and inst.get('instrument_type', '') == 'EQ':
+                self.instrument_token = str(inst.get('instrument_token'))
+                self.instrument_token_int = int(inst.get('instrument_token'))
+                self.tradingsymbol = self.instrument_symbol
+                self.instrument_name = f"{inst.get('name')} EQ"
                 
-                if tradingsymbol == self.instrument_symbol and instrument_type == 'EQ':
-                    self.instrument_token = str(inst.get('instrument_token'))
-                    self.tradingsymbol = tradingsymbol
-                    self.instrument_name = f"{inst.get('name')} EQ"
-                    
-                    logger.info(f"✓ Selected Equity: {self.tradingsymbol}")
-                    logger.info(f"  Instrument Token: {self.instrument_token}")
-                    logger.info(f"  Name: {inst.get('name')}")
-                    logger.info(f"  Lot Size: {self.lot_size} units")
-                    logger.info(f"  Trading: {self.trading_lots} lot(s) = {self.quantity} units")
-                    
-                    return inst
+                logger.info(f"✓ Selected Equity: {self.tradingsymbol}")
+                logger.info(f"  Instrument Token: {self.instrument_token}")
+                logger.info(f"  Name: {inst.get('name')}")
+                logger.info(f"  Lot Size: {self.lot_size} units")
+                logger.info(f"  Trading: {self.trading_lots} lot(s) = {self.quantity} units")
+                
+                return inst
             
             # If not found, log helpful message
             logger.error(f"✗ Equity instrument not found: {self.instrument_symbol}")
@@ -483,14 +553,30 @@ class KiteDataFetcher:
             logger.error(traceback.format_exc())
             return None
     
+    def read_access_token(self):
+        """Return the access token, re-reading access_token.txt only when it has changed on disk"""
+        try:
+            stat = os.stat("access_token.txt")
+        except FileNotFoundError:
+            self.access_token_stat = None
+            return None
+        
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        if stat_key != self.access_token_stat or not self.access_token:
+            logger.info("Reading access token from file: access_token.txt")
+            self.access_token_stat = stat_key
+            return read_from_file("access_token.txt")
+        
+        logger.info("Reusing cached access token (access_token.txt unchanged)")
+        return self.access_token
+    
     def connect_to_kite(self):
         """Connect to Kite API using access token"""
         logger.info("Attempting to connect to Kite API...")
         
         try:
-            # Read access token from file
-            logger.info("Reading access token from file: access_token.txt")
-            self.access_token = read_from_file("access_token.txt")
+            # Read access token from file (re-read only if the file changed since last connect)
+            self.access_token = self.read_access_token()
             
             if not self.access_token:
                 logger.error("Access token is empty or not found")
@@ -498,9 +584,13 @@ class KiteDataFetcher:
             
             logger.info(f"Access token loaded: {self.access_token[:10]}...")
             
-            # Initialize KiteConnect
-            logger.info("Initializing KiteConnect instance")
-            self.kite = KiteConnect(api_key=self.api_key)
+            # Initialize KiteConnect once and reuse it across reconnects so its
+            # pooled HTTPS session (keep-alive, no TLS handshake per order) survives
+            if self.kite is None:
+                logger.info("Initializing KiteConnect instance")
+                self.kite = KiteConnect(api_key=self.api_key, pool=KITE_HTTP_POOL)
+            else:
+                logger.info("Reusing existing KiteConnect instance")
             
             # Set access token
             logger.info("Setting access token")
@@ -546,105 +636,248 @@ class KiteDataFetcher:
     
     def setup_websocket(self):
         """Setup WebSocket connection for real-time tick data"""
-        try:
-            logger.info("🔌 Setting up WebSocket connection...")
-            
-            # Initialize KiteTicker
-            self.kws = KiteTicker(self.api_key, self.access_token)
-            
-            # Define callbacks
-            def on_ticks(ws, ticks):
-                """Callback for tick data"""
-                for tick in ticks:
-                    if tick['instrument_token'] == int(self.instrument_token):
-                        self.last_tick_price = tick.get('last_price', 0)
-                        last_traded_price = tick.get('last_price', 0)
-                        
-                        # Check if we have a pending alert candle waiting for entry
-                        if self.alert_candle and not self.open_trade:
-                            self.check_entry_trigger_realtime(last_traded_price)
-                        
-                        # Check if we have an open trade to monitor for SL/Target
-                        if self.open_trade:
-                            self.check_exit_conditions(last_traded_price)
-            
-            def on_connect(ws, response):
-                """Callback when WebSocket connects"""
-                logger.info("✓ WebSocket connected successfully")
-                self.ws_connected = True
+        # Serialised so config changes and reconnects can never leave two KiteTickers running
+        with self.ws_lock:
+            try:
+                logger.info("🔌 Setting up WebSocket connection...")
                 
-                # Subscribe to instrument with FULL mode to get OHLC data
-                if self.instrument_token:
-                    ws.subscribe([int(self.instrument_token)])
-                    ws.set_mode(ws.MODE_FULL, [int(self.instrument_token)])  # FULL mode for complete tick data
-                    logger.info(f"📡 Subscribed to {self.tradingsymbol} ({self.instrument_token})")
-                    logger.info(f"📊 WebSocket Mode: FULL (real-time LTP for entry triggers)")
-            
-            def on_close(ws, code, reason):
-                """Callback when WebSocket closes"""
-                logger.warning(f"⚠ WebSocket closed: {code} - {reason}")
-                self.ws_connected = False
-            
-            def on_error(ws, code, reason):
-                """Callback on error"""
-                logger.error(f"✗ WebSocket error: {code} - {reason}")
-            
-            # Assign callbacks
-            self.kws.on_ticks = on_ticks
-            self.kws.on_connect = on_connect
-            self.kws.on_close = on_close
-            self.kws.on_error = on_error
-            
-            # Start WebSocket in a separate thread
-            ws_thread = threading.Thread(target=self.kws.connect, daemon=True)
-            ws_thread.start()
-            
-            # Wait a moment for connection
-            time.sleep(2)
-            
-            logger.info("✓ WebSocket setup complete")
-            return True
-            
+                # Close the previous KiteTicker first - otherwise its auto-reconnect keeps it (and its socket) alive
+                self.close_websocket()
+                
+                # Initialize KiteTicker
+                self.kws = KiteTicker(self.api_key, self.access_token)
+                
+                # Define callbacks
+                def on_ticks(ws, ticks):
+                    """Callback for tick data - only enqueues, processing happens on the tick worker"""
+                    # Resolve per-callback constants once instead of on every tick
+                    instrument_token = self.instrument_token_int
+                    
+                    # Filter the batch once, then only touch ticks for our instrument
+                    matching = [tick for tick in ticks if tick['instrument_token'] == instrument_token]
+                    prices = [tick.get('last_price', 0) for tick in matching]
+                    
+                    # One queue operation per WebSocket packet rather than per tick
+                    if prices:
+                        self.last_tick_price = prices[-1]
+                        self.enqueue_ticks(prices)
+                
+                def on_connect(ws, response):
+                    """Callback when WebSocket connects"""
+                    logger.info("✓ WebSocket connected successfully")
+                    self.ws_connected = True
+                    self.ws_connected_event.set()
+                    self.tune_websocket_socket(ws)
+                    
+                    # Subscribe to instrument with FULL mode to get OHLC data
+                    if self.instrument_token:
+                        ws.subscribe([self.instrument_token_int])
+                        ws.set_mode(ws.MODE_FULL, [self.instrument_token_int])  # FULL mode for complete tick data
+                        logger.info(f"📡 Subscribed to {self.tradingsymbol} ({self.instrument_token})")
+                        logger.info(f"📊 WebSocket Mode: FULL (real-time LTP for entry triggers)")
+                
+                def on_close(ws, code, reason):
+                    """Callback when WebSocket closes"""
+                    logger.warning(f"⚠ WebSocket closed: {code} - {reason}")
+                    if ws is not self.kws:
+                        return  # Late close from a ticker we already replaced - don't touch the new one's state
+                    self.ws_connected = False
+                    self.ws_connected_event.clear()
+                
+                def on_error(ws, code, reason):
+                    """Callback on error"""
+                    logger.error(f"✗ WebSocket error: {code} - {reason}")
+                
+                # Start tick worker (once) before ticks can arrive
+                self.start_tick_worker()
+                
+                # Assign callbacks
+                self.kws.on_ticks = on_ticks
+                self.kws.on_connect = on_connect
+                self.kws.on_close = on_close
+                self.kws.on_error = on_error
+                
+                # Start WebSocket in a separate thread
+                self.ws_connected_event.clear()
+                ws_thread = threading.Thread(target=self.kws.connect, daemon=True)
+                ws_thread.start()
+                
+                # Wait for on_connect instead of a fixed sleep - returns as soon as the socket is up
+                if not self.ws_connected_event.wait(timeout=10):
+                    logger.warning("⚠ WebSocket not connected yet after 10s - KiteTicker will keep retrying in background")
+                
+                logger.info("✓ WebSocket setup complete")
+                return True
+                
+            except Exception as e:
+                logger.error(f"✗ Error setting up WebSocket: {str(e)}")
+                import traceback
+                logger.error(traceback.format_exc())
+                return False
+    
+    def close_websocket(self):
+        """Close the current KiteTicker and stop its auto-reconnect (caller holds ws_lock)"""
+        if self.kws is None:
+            return
+        try:
+            # KiteTicker runs inside Twisted's reactor thread, which is not thread-safe -
+            # hand the close (stop_retry + sendClose) over to the reactor instead of calling it here
+            reactor.callFromThread(self.kws.close)
+            logger.info("✓ Closed existing WebSocket connection")
         except Exception as e:
-            logger.error(f"✗ Error setting up WebSocket: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
-            return False
+            logger.warning(f"⚠ Error closing existing WebSocket: {str(e)}")
+        self.kws = None
+        self.ws_connected = False
+        self.ws_connected_event.clear()
+    
+    def tune_websocket_socket(self, ws):
+        """Disable Nagle and enable fast dead-peer detection on the ticker's TCP socket"""
+        try:
+            # ws is the KiteTicker; ws.ws is the autobahn protocol. Under wss:// its transport is
+            # Twisted's TLS wrapper (whose handle is the pyOpenSSL connection, not a socket),
+            # so walk down to the TCP transport underneath it
+            tcp = ws.ws.transport
+            while not hasattr(tcp, 'setTcpNoDelay'):
+                tcp = tcp.transport
+            tcp.setTcpNoDelay(True)
+            tcp.setTcpKeepAlive(True)
+            if hasattr(socket, 'TCP_USER_TIMEOUT'):
+                # Fail unacknowledged sends after 30s instead of the kernel's ~15 minutes (Linux only)
+                tcp.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, 30000)
+            logger.info("✓ WebSocket socket tuned (TCP_NODELAY, SO_KEEPALIVE)")
+        except Exception as e:
+            logger.warning(f"⚠ Could not tune WebSocket socket options: {str(e)}")
+    
+    def start_tick_worker(self):
+        """Start the background thread that processes queued tick prices"""
+        if self.tick_worker is not None and self.tick_worker.is_alive():
+            return
+        
+        self.tick_worker = threading.Thread(target=self.process_tick_queue, daemon=True)
+        self.tick_worker.start()
+        logger.info("✓ Tick worker thread started")
+    
+    def enqueue_ticks(self, prices):
+        """Queue a packet's tick prices for the worker, dropping the oldest packet when the queue is full"""
+        try:
+            self.tick_queue.put_nowait(prices)
+        except queue.Full:
+            try:
+                dropped = self.tick_queue.get_nowait()
+                self.dropped_ticks += len(dropped)
+            except queue.Empty:
+                pass
+            try:
+                self.tick_queue.put_nowait(prices)
+            except queue.Full:
+                self.dropped_ticks += len(prices)
+    
+    def clear_tick_queue(self):
+        """Discard queued tick packets (e.g. after switching instrument)"""
+        while True:
+            try:
+                self.tick_queue.get_nowait()
+            except queue.Empty:
+                return
+    
+    def process_tick_queue(self):
+        """
+        Tick worker loop: runs entry trigger and SL/Target checks off the WebSocket thread
+        so order placement, file writes and emails never block tick delivery
+        """
+        check_entry = self.check_entry_trigger_realtime
+        check_exit = self.check_exit_conditions
+        
+        while True:
+            prices = self.tick_queue.get()
+            # Prices are checked in arrival order so an SL/Target touch mid-packet is never skipped
+            for last_traded_price in prices:
+                try:
+                    # Check if we have a pending alert candle waiting for entry
+                    if self.alert_candle and not self.open_trade:
+                        check_entry(last_traded_price)
+                    
+                    # Check if we have an open trade to monitor for SL/Target
+                    if self.open_trade:
+                        check_exit(last_traded_price)
+                except Exception as e:
+                    logger.error(f"✗ Error processing tick: {str(e)}")
+                    import traceback
+                    logger.error(traceback.format_exc())
+    
+    def start_notification_worker(self):
+        """Start the background thread that sends queued trade emails"""
+        if self.notification_worker is not None and self.notification_worker.is_alive():
+            return
+        
+        self.notification_worker = threading.Thread(target=self.process_notification_queue, daemon=True)
+        self.notification_worker.start()
+        logger.info("✓ Notification worker thread started")
+    
+    def notify_trade(self, trade_type, trade):
+        """
+        Queue a trade email for the notification worker (never blocks)
+        The worker reads trade later, so callers that keep mutating it must pass a copy
+        """
+        if not EMAIL_ENABLED:
+            return
+        self.start_notification_worker()
+        try:
+            self.notification_queue.put_nowait((trade_type, trade))
+        except queue.Full:
+            logger.warning(f"⚠ Notification queue full - dropping {trade_type} email for {trade.get('trade_id')}")
+    
+    def process_notification_queue(self):
+        """Notification worker loop: sends trade emails off the trading path"""
+        while True:
+            trade_type, trade = self.notification_queue.get()
+            try:
+                send_trade_notification(trade_type, trade)
+            except Exception as e:
+                logger.error(f"✗ Error sending {trade_type} notification: {str(e)}")
+                import traceback
+                logger.error(traceback.format_exc())
+    
+    def set_open_trade(self, trade):
+        """Set (or clear with None) the open trade together with its cached exit levels"""
+        if trade is None:
+            self.open_trade_levels = None
+        else:
+            self.open_trade_levels = OpenTradeLevels(
+                direction=1 if trade['transaction_type'] == 'BUY' else -1,
+                stop_loss=trade['stop_loss'],
+                target=trade['target']
+            )
+        self.open_trade = trade
     
     def check_exit_conditions(self, current_price):
-        """Check if SL or Target is hit for open trade"""
-        if not self.open_trade or not current_price:
+        """Check if SL or Target is hit for open trade
+        
+        Runs for every queued tick, so log calls use lazy %-style arguments
+        """
+        levels = self.open_trade_levels
+        if levels is None or not current_price:
             return
         
-        trade = self.open_trade
-        trade_type = trade.get('transaction_type')
-        stop_loss = trade.get('stop_loss')
-        target = trade.get('target')
-        
-        # Check for BUY trade
-        if trade_type == 'BUY':
-            if current_price <= stop_loss:
-                logger.info(f"🛑 STOP LOSS HIT! Price: ₹{current_price:.2f} <= SL: ₹{stop_loss:.2f}")
-                self.exit_trade('STOP_LOSS', current_price)
-            elif current_price >= target:
-                logger.info(f"🎯 TARGET HIT! Price: ₹{current_price:.2f} >= Target: ₹{target:.2f}")
-                self.exit_trade('TARGET', current_price)
-        
-        # Check for SELL trade
-        elif trade_type == 'SELL':
-            if current_price >= stop_loss:
-                logger.info(f"🛑 STOP LOSS HIT! Price: ₹{current_price:.2f} >= SL: ₹{stop_loss:.2f}")
-                self.exit_trade('STOP_LOSS', current_price)
-            elif current_price <= target:
-                logger.info(f"🎯 TARGET HIT! Price: ₹{current_price:.2f} <= Target: ₹{target:.2f}")
-                self.exit_trade('TARGET', current_price)
+        stop_loss = levels.stop_loss
+        target = levels.target
+        direction = levels.direction
+        
+        # Signed distances: BUY exits on price <= SL / price >= target, SELL on the mirror image
+        if direction * (current_price - stop_loss) <= 0:
+            logger.info("🛑 STOP LOSS HIT! Price: ₹%.2f | SL: ₹%.2f", current_price, stop_loss)
+            self.exit_trade('STOP_LOSS', current_price)
+        elif direction * (current_price - target) >= 0:
+            logger.info("🎯 TARGET HIT! Price: ₹%.2f | Target: ₹%.2f", current_price, target)
+            self.exit_trade('TARGET', current_price)
     
     def check_time_based_exit(self):
         """Check if current time is 3:25 PM or later - force exit all trades"""
         now = datetime.now()
-        exit_time = now.replace(hour=15, minute=25, second=0, microsecond=0)
+        # The tick worker can exit the trade at any moment - read it once
+        trade = self.open_trade
         
-        if now >= exit_time and self.open_trade:
+        if minute_of_day(now) >= TIME_EXIT_MINUTE and trade:
             logger.info("⏰ 3:25 PM - Time-based exit triggered")
             # Use last tick price or try to get current LTP
             exit_price = self.last_tick_price
@@ -653,20 +886,24 @@ class KiteDataFetcher:
                     ltp_data = self.kite.ltp([self.instrument_token])
                     exit_price = ltp_data.get(self.instrument_token, {}).get('last_price', 0)
                 except:
-                    exit_price = self.open_trade.get('entry_price', 0)
+                    exit_price = trade.get('entry_price', 0)
             
             self.exit_trade('TIME_EXIT_325PM', exit_price)
     
     def exit_trade(self, exit_reason, exit_price):
         """Exit the current open trade"""
-        if not self.open_trade:
-            return
+        # Take ownership and clear open_trade before any slow work (order, file, email),
+        # so no later tick or the time-based exit can exit the same trade twice
+        with self.trade_lock:
+            trade = self.open_trade
+            if not trade:
+                return
+            self.set_open_trade(None)
         
         logger.info("="*80)
         logger.info(f"📤 EXITING TRADE - {exit_reason}")
         logger.info("-"*80)
         
-        trade = self.open_trade
         trade['exit_price'] = exit_price
         trade['exit_time'] = datetime.now().isoformat()
         trade['exit_reason'] = exit_reason
@@ -718,23 +955,18 @@ class KiteDataFetcher:
         # Update trade in file
         self.update_trade_in_file(trade)
         
-        # Send email notification
-        if EMAIL_ENABLED:
-            send_trade_notification('EXIT', trade)
+        # Send email notification - trade is no longer open_trade, so it's handed off without a copy
+        self.notify_trade('EXIT', trade)
         
         logger.info(f"✅ Trade exited successfully")
         logger.info("="*80)
-        
-        # Clear open trade
-        self.open_trade = None
     
     def update_trade_in_file(self, updated_trade):
         """Update a specific trade in the trades file"""
         try:
             trades = []
             if os.path.exists(self.trades_file):
-                with open(self.trades_file, 'r') as f:
-                    trades = json.load(f)
+                trades = load_json_file(self.trades_file)
             
             # Find and update the trade
             for i, trade in enumerate(trades):
@@ -742,9 +974,8 @@ class KiteDataFetcher:
                     trades[i] = updated_trade
                     break
             
-            # Save back to file
-            with open(self.trades_file, 'w') as f:
-                json.dump(trades, f, indent=2)
+            # Save back to file (serialized once, single atomic write)
+            write_file_atomic(self.trades_file, dumps_json(trades))
             
             logger.info(f"💾 Trade updated in {self.trades_file}")
             return True
@@ -761,7 +992,8 @@ class KiteDataFetcher:
                 if '+' in candle_date:
                     date_obj = datetime.fromisoformat(candle_date)
                 else:
-                    date_obj = datetime.strptime(candle_date.split('+')[0].strip(), '%Y-%m-%d %H:%M:%S')
+                    # Fixed 'YYYY-MM-DD HH:MM:SS' layout - fromisoformat avoids strptime's format parsing
+                    date_obj = datetime.fromisoformat(candle_date[:19])
             except:
                 return False
         elif isinstance(candle_date, datetime):
@@ -770,7 +1002,7 @@ class KiteDataFetcher:
             return False
         
         # First candle is 9:15 AM
-        return date_obj.hour == 9 and date_obj.minute == 15
+        return minute_of_day(date_obj) == FIRST_CANDLE_MINUTE
     
     def get_date_range_for_candles(self):
         """
@@ -788,37 +1020,25 @@ class KiteDataFetcher:
     def calculate_next_5min_interval(self):
         """
         Calculate seconds to wait until next 5-minute interval + processing delay
-        (e.g., if current time is 9:17, wait until 9:20:30)
+        (e.g., if current time is 9:17, wait until 9:20:10)
         The extra delay ensures the candle has fully formed and API has processed it
-        """
-        now = datetime.now()
         
-        # Round up to next 5-minute mark
-        minutes = now.minute
-        next_interval_minute = ((minutes // 5) + 1) * 5
+        Uses integer epoch-second arithmetic: interval boundaries are multiples of
+        fetch_interval since the epoch, which line up with local 5-minute marks
+        because timezone offsets (IST = +5:30) are whole multiples of 5 minutes.
+        """
+        now_ts = time.time()
         
-        # Handle minute overflow and midnight crossing
-        if next_interval_minute >= 60:
-            # Next interval is in the next hour
-            next_time = now.replace(minute=0, second=0, microsecond=0)
-            next_time = next_time + timedelta(hours=1)
-        else:
-            next_time = now.replace(minute=next_interval_minute, second=0, microsecond=0)
+        # Round up to next interval boundary (strictly after now)
+        next_boundary = (int(now_ts) // self.fetch_interval + 1) * self.fetch_interval
         
         # Add processing delay to ensure candle is complete
-        next_time_with_delay = next_time + timedelta(seconds=self.candle_processing_delay)
-        wait_seconds = (next_time_with_delay - now).total_seconds()
-        
-        # Safety check: if wait time is negative or too small, add 5 minutes
-        if wait_seconds < 0:
-            logger.warning(f"⚠ Negative wait time detected ({wait_seconds:.0f}s), adding 5 minutes")
-            next_time = next_time + timedelta(minutes=5)
-            next_time_with_delay = next_time + timedelta(seconds=self.candle_processing_delay)
-            wait_seconds = (next_time_with_delay - now).total_seconds()
+        wait_seconds = next_boundary + self.candle_processing_delay - now_ts
         
-        logger.info(f"⏰ Current time: {now.strftime('%H:%M:%S')}")
+        next_time = datetime.fromtimestamp(next_boundary)
+        logger.info(f"⏰ Current time: {datetime.fromtimestamp(now_ts).strftime('%H:%M:%S')}")
         logger.info(f"⏰ Next candle completes at: {next_time.strftime('%H:%M:%S')}")
-        logger.info(f"⏰ Will fetch at: {next_time_with_delay.strftime('%H:%M:%S')} (+{self.candle_processing_delay}s delay)")
+        logger.info(f"⏰ Will fetch at: {(next_time + timedelta(seconds=self.candle_processing_delay)).strftime('%H:%M:%S')} (+{self.candle_processing_delay}s delay)")
         logger.info(f"⏰ Waiting {int(wait_seconds)} seconds...")
         
         return wait_seconds
@@ -832,11 +1052,9 @@ class KiteDataFetcher:
             logger.warning("⚠ Not enough candles for RSI calculation (need 15+)")
             return None, None
         
-        # Convert to pandas DataFrame
-        df = pd.DataFrame(candles)
-        
-        # Ensure close values are float64 (required by TA-Lib)
-        closes = df["close"].astype(np.float64).values
+        # Build a contiguous float64 close array (required by TA-Lib) in one pass,
+        # without materializing a DataFrame of every OHLCV column
+        closes = np.fromiter((c["close"] for c in candles), dtype=np.float64, count=len(candles))
         
         # Calculate RSI using TA-Lib (14-period)
         rsi_values = talib.RSI(closes, timeperiod=14)
@@ -858,18 +1076,17 @@ class KiteDataFetcher:
         try:
             trades = []
             if os.path.exists(self.trades_file):
-                with open(self.trades_file, 'r') as f:
-                    try:
-                        trades = json.load(f)
-                        logger.info(f"📂 Loaded {len(trades)} existing trades from {self.trades_file}")
-                    except:
-                        trades = []
-                        logger.warning(f"⚠ Could not read existing trades, starting fresh")
+                try:
+                    trades = load_json_file(self.trades_file)
+                    logger.info(f"📂 Loaded {len(trades)} existing trades from {self.trades_file}")
+                except:
+                    trades = []
+                    logger.warning(f"⚠ Could not read existing trades, starting fresh")
             
             trades.append(trade)
             
-            with open(self.trades_file, 'w') as f:
-                json.dump(trades, f, indent=2)
+            # Serialize once and write in a single atomic call
+            write_file_atomic(self.trades_file, dumps_json(trades))
             
             logger.info(f"💾 Trade saved to {self.trades_file} (Total trades: {len(trades)})")
             return True
@@ -887,8 +1104,10 @@ class KiteDataFetcher:
             logger.info(f"📝 PLACING PAPER TRADE")
             logger.info("-"*80)
             
+            # One clock read per trade so trade_id and timestamp always agree
+            now = datetime.now()
             trade = {
-                "trade_id": f"PT_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}",
+                "trade_id": format_trade_id("PT", now),
                 "trade_mode": "PAPER",
                 "instrument_token": self.instrument_token,
                 "tradingsymbol": self.tradingsymbol,
@@ -899,7 +1118,7 @@ class KiteDataFetcher:
                 "order_type": "MARKET",
                 "product": "MIS",
                 "entry_price": price,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now.isoformat(),
                 "status": "OPEN",
                 "alert_rsi": round(alert_candle.get('rsi'), 2) if alert_candle.get('rsi') else None,
                 "alert_open": alert_candle.get('open'),
@@ -926,9 +1145,8 @@ class KiteDataFetcher:
                 logger.info(f"📁 Saved to: {self.trades_file}")
                 logger.info("="*80)
                 
-                # Send email notification
-                if EMAIL_ENABLED:
-                    send_trade_notification('ENTRY', trade)
+                # Send email notification (copy - this dict becomes open_trade and is updated on exit)
+                self.notify_trade('ENTRY', dict(trade))
                 
                 return trade
             else:
@@ -973,9 +1191,11 @@ class KiteDataFetcher:
             logger.info(f"✅ Order placed successfully!")
             logger.info(f"📋 Order ID: {order_id}")
             
+            # One clock read per trade so trade_id and timestamp always agree
+            now = datetime.now()
             trade = {
                 "order_id": order_id,
-                "trade_id": f"RT_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}",
+                "trade_id": format_trade_id("RT", now),
                 "trade_mode": "REAL",
                 "instrument_token": self.instrument_token,
                 "tradingsymbol": self.tradingsymbol,
@@ -986,7 +1206,7 @@ class KiteDataFetcher:
                 "order_type": "MARKET",
                 "product": "MIS",
                 "entry_price": price,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now.isoformat(),
                 "status": "OPEN",
                 "alert_rsi": round(alert_candle.get('rsi'), 2) if alert_candle.get('rsi') else None,
                 "alert_open": alert_candle.get('open'),
@@ -1013,9 +1233,8 @@ class KiteDataFetcher:
                 logger.info(f"📁 Saved to: {self.trades_file}")
                 logger.info("="*80)
                 
-                # Send email notification
-                if EMAIL_ENABLED:
-                    send_trade_notification('ENTRY', trade)
+                # Send email notification (copy - this dict becomes open_trade and is updated on exit)
+                self.notify_trade('ENTRY', dict(trade))
                 
                 return trade
             else:
@@ -1048,28 +1267,32 @@ class KiteDataFetcher:
         # Check time-based exit (3:25 PM)
         self.check_time_based_exit()
         
+        # The tick worker can enter or exit at any moment - read open_trade/alert_candle once each
+        open_trade = self.open_trade
+        pending_alert = self.alert_candle
+        
         # If trade is open, skip new entries
-        if self.open_trade is not None:
+        if open_trade is not None:
             logger.info("⚠ NEW TRADE SKIPPED - Trade already open")
-            logger.info(f"   Current trade: {self.open_trade.get('trade_id')} - {self.open_trade.get('transaction_type')}")
-            logger.info(f"   Entry: ₹{self.open_trade.get('entry_price'):.2f}")
-            logger.info(f"   SL: ₹{self.open_trade.get('stop_loss'):.2f} | Target: ₹{self.open_trade.get('target'):.2f}")
+            logger.info(f"   Current trade: {open_trade.get('trade_id')} - {open_trade.get('transaction_type')}")
+            logger.info(f"   Entry: ₹{open_trade.get('entry_price'):.2f}")
+            logger.info(f"   SL: ₹{open_trade.get('stop_loss'):.2f} | Target: ₹{open_trade.get('target'):.2f}")
             logger.info(f"   Reason: Only 1 trade allowed at a time")
             return
         
         # Check if we have a pending alert candle waiting for entry
-        if self.alert_candle is not None:
+        if pending_alert is not None:
             logger.info("🔍 Checking pending alert candle...")
-            logger.info(f"   Alert Type: {self.alert_candle.get('type')}")
-            logger.info(f"   Alert High: ₹{self.alert_candle.get('high'):.2f} | Alert Low: ₹{self.alert_candle.get('low'):.2f}")
-            logger.info(f"   Trigger Price: ₹{self.alert_candle.get('trigger_price'):.2f}")
-            logger.info(f"   Alert RSI: {self.alert_candle.get('rsi'):.2f}")
+            logger.info(f"   Alert Type: {pending_alert.get('type')}")
+            logger.info(f"   Alert High: ₹{pending_alert.get('high'):.2f} | Alert Low: ₹{pending_alert.get('low'):.2f}")
+            logger.info(f"   Trigger Price: ₹{pending_alert.get('trigger_price'):.2f}")
+            logger.info(f"   Alert RSI: {pending_alert.get('rsi'):.2f}")
             logger.info(f"   Current RSI: {rsi:.2f}")
             
             # Alert is still valid, WebSocket is monitoring for entry
             logger.info("   ✓ Alert still valid")
             logger.info("   📡 WebSocket monitoring active for real-time entry trigger")
-            logger.info(f"   ⏳ Waiting for WebSocket to detect price crossing ₹{self.alert_candle.get('trigger_price'):.2f}")
+            logger.info(f"   ⏳ Waiting for WebSocket to detect price crossing ₹{pending_alert.get('trigger_price'):.2f}")
             
             # Check if new crossover happens - if yes, we'll replace the old alert below
             # Don't return yet, continue to check for new crossover
@@ -1110,8 +1333,8 @@ class KiteDataFetcher:
             logger.info(f"   Current RSI: {rsi:.2f}")
             
             # If there's an existing alert, discard it and replace with new one
-            if self.alert_candle is not None:
-                logger.info(f"   ⚠️  Replacing previous alert candle (Alert RSI: {self.alert_candle.get('rsi'):.2f})")
+            if pending_alert is not None:
+                logger.info(f"   ⚠️  Replacing previous alert candle (Alert RSI: {pending_alert.get('rsi'):.2f})")
                 logger.info(f"   New crossover detected - old alert will be replaced")
             
             # Check candle range condition (high - low < high_low_diff from config)
@@ -1125,18 +1348,21 @@ class KiteDataFetcher:
                 logger.info(f"   📡 WebSocket will monitor real-time price for entry")
                 
                 # Mark this as alert candle (replaces old alert if exists)
-                self.alert_candle = {
-                    'type': 'BUY',
-                    'rsi': rsi,
-                    'date': latest_candle.get('date'),
-                    'open': latest_candle['open'],
-                    'high': latest_candle['high'],
-                    'low': latest_candle['low'],
-                    'close': latest_candle['close'],
-                    'trigger_price': latest_candle['high'],  # Entry trigger
-                    'stop_loss': latest_candle['low'],
-                    'target': latest_candle['high'] + self.target
-                }
+                # Under trade_lock so the tick worker never commits an entry against a replaced alert
+                with self.trade_lock:
+                    self.alert_candle = {
+                        'type': 'BUY',
+                        'rsi': rsi,
+                        'instrument_generation': self.instrument_generation,
+                        'date': latest_candle.get('date'),
+                        'open': latest_candle['open'],
+                        'high': latest_candle['high'],
+                        'low': latest_candle['low'],
+                        'close': latest_candle['close'],
+                        'trigger_price': latest_candle['high'],  # Entry trigger
+                        'stop_loss': latest_candle['low'],
+                        'target': latest_candle['high'] + self.target
+                    }
                 logger.info("="*80)
             else:
                 logger.info(f"   ✗ Range condition NOT met (>= {self.high_low_diff}), ignoring signal")
@@ -1148,8 +1374,8 @@ class KiteDataFetcher:
             logger.info(f"   Current RSI: {rsi:.2f}")
             
             # If there's an existing alert, discard it and replace with new one
-            if self.alert_candle is not None:
-                logger.info(f"   ⚠️  Replacing previous alert candle (Alert RSI: {self.alert_candle.get('rsi'):.2f})")
+            if pending_alert is not None:
+                logger.info(f"   ⚠️  Replacing previous alert candle (Alert RSI: {pending_alert.get('rsi'):.2f})")
                 logger.info(f"   New crossover detected - old alert will be replaced")
             
             # Check candle range condition
@@ -1163,18 +1389,21 @@ class KiteDataFetcher:
                 logger.info(f"   📡 WebSocket will monitor real-time price for entry")
                 
                 # Mark this as alert candle (replaces old alert if exists)
-                self.alert_candle = {
-                    'type': 'SELL',
-                    'rsi': rsi,
-                    'date': latest_candle.get('date'),
-                    'open': latest_candle['open'],
-                    'high': latest_candle['high'],
-                    'low': latest_candle['low'],
-                    'close': latest_candle['close'],
-                    'trigger_price': latest_candle['low'],  # Entry trigger
-                    'stop_loss': latest_candle['high'],
-                    'target': latest_candle['low'] - self.target
-                }
+                # Under trade_lock so the tick worker never commits an entry against a replaced alert
+                with self.trade_lock:
+                    self.alert_candle = {
+                        'type': 'SELL',
+                        'rsi': rsi,
+                        'instrument_generation': self.instrument_generation,
+                        'date': latest_candle.get('date'),
+                        'open': latest_candle['open'],
+                        'high': latest_candle['high'],
+                        'low': latest_candle['low'],
+                        'close': latest_candle['close'],
+                        'trigger_price': latest_candle['low'],  # Entry trigger
+                        'stop_loss': latest_candle['high'],
+                        'target': latest_candle['low'] - self.target
+                    }
                 logger.info("="*80)
             else:
                 logger.info(f"   ✗ ALERT NOT MARKED - Range condition NOT met (>= {self.high_low_diff})")
@@ -1193,17 +1422,20 @@ class KiteDataFetcher:
         - BUY: LTP crosses ABOVE alert candle's HIGH
         - SELL: LTP crosses BELOW alert candle's LOW
         """
-        if not self.alert_candle:
+        alert = self.alert_candle
+        if not alert:
             return
         
-        alert = self.alert_candle
+        # Runs for every queued tick - read the alert fields once into locals
+        alert_type = alert['type']
+        trigger_price = alert['trigger_price']
         
-        if alert['type'] == 'BUY':
+        if alert_type == 'BUY':
             # BUY: Check if LTP crosses ABOVE alert candle's HIGH
-            if ltp > alert['trigger_price']:
+            if ltp > trigger_price:
                 logger.info("="*80)
                 logger.info(f"✅ ENTRY TRIGGER HIT (REAL-TIME)!")
-                logger.info(f"   LTP: ₹{ltp:.2f} > Alert High: ₹{alert['trigger_price']:.2f}")
+                logger.info(f"   LTP: ₹{ltp:.2f} > Alert High: ₹{trigger_price:.2f}")
                 logger.info(f"   Entry Method: Real-time WebSocket (LTP-based)")
                 logger.info("="*80)
                 
@@ -1214,15 +1446,14 @@ class KiteDataFetcher:
                     trade = self.place_real_trade("BUY", ltp, alert, trigger_ltp=ltp)
                 
                 if trade:
-                    self.open_trade = trade
-                    self.alert_candle = None  # Clear alert candle
+                    self.commit_entry_trade(trade, alert)
         
-        elif alert['type'] == 'SELL':
+        elif alert_type == 'SELL':
             # SELL: Check if LTP crosses BELOW alert candle's LOW
-            if ltp < alert['trigger_price']:
+            if ltp < trigger_price:
                 logger.info("="*80)
                 logger.info(f"✅ ENTRY TRIGGER HIT (REAL-TIME)!")
-                logger.info(f"   LTP: ₹{ltp:.2f} < Alert Low: ₹{alert['trigger_price']:.2f}")
+                logger.info(f"   LTP: ₹{ltp:.2f} < Alert Low: ₹{trigger_price:.2f}")
                 logger.info(f"   Entry Method: Real-time WebSocket (LTP-based)")
                 logger.info("="*80)
                 
@@ -1233,8 +1464,35 @@ class KiteDataFetcher:
                     trade = self.place_real_trade("SELL", ltp, alert, trigger_ltp=ltp)
                 
                 if trade:
-                    self.open_trade = trade
+                    self.commit_entry_trade(trade, alert)
+    
+    def commit_entry_trade(self, trade, alert):
+        """Track a just-placed entry as the open trade - the order exists, so it is never dropped"""
+        with self.trade_lock:
+            # A config change switched instruments while the order was in flight: ticks now belong
+            # to the new instrument, so this position's SL/target can't be watched here
+            instrument_changed = alert.get('instrument_generation') != self.instrument_generation
+            if not instrument_changed:
+                self.set_open_trade(trade)
+                # A crossover may have marked a newer alert meanwhile - that one stays pending
+                if self.alert_candle is alert:
                     self.alert_candle = None  # Clear alert candle
+        
+        if instrument_changed:
+            self.flag_untracked_trade(trade, "Instrument changed in config while the entry order was placed")
+    
+    def flag_untracked_trade(self, trade, reason):
+        """Mark a position the server no longer monitors (no SL/target/3:25 PM exit) for manual exit"""
+        logger.error("="*80)
+        logger.error(f"🚨 UNTRACKED POSITION - {reason}")
+        logger.error(f"   Trade ID: {trade.get('trade_id')} | {trade.get('transaction_type')} {trade.get('tradingsymbol')}")
+        logger.error(f"   Entry: ₹{trade.get('entry_price', 0):.2f} | Quantity: {trade.get('quantity')}")
+        logger.error(f"   No SL/Target/time exit will be placed - square off manually")
+        logger.error("="*80)
+        
+        trade['status'] = 'UNTRACKED'
+        trade['untracked_reason'] = reason
+        self.update_trade_in_file(trade)
     
     def fetch_historical_data(self):
         """Fetch latest 15 candles of 5-minute interval historical data"""
@@ -1258,8 +1516,8 @@ class KiteDataFetcher:
             from_date, to_date = self.get_date_range_for_candles()
             
             logger.info(f"Fetching data from last 10 days (up to now)...")
-            logger.info(f"From: {from_date.strftime('%Y-%m-%d %H:%M:%S')}")
-            logger.info(f"To: {to_date.strftime('%Y-%m-%d %H:%M:%S')}")
+            logger.info(f"From: {from_date.isoformat(sep=' ', timespec='seconds')}")
+            logger.info(f"To: {to_date.isoformat(sep=' ', timespec='seconds')}")
             logger.info(f"Interval: 5minute")
             
             # Fetch historical data
@@ -1300,8 +1558,9 @@ class KiteDataFetcher:
             
             # Get only the latest 14 COMPLETE candles from whatever is available
             # Since we already excluded the current candle, all these are complete
-            latest_candles = complete_candles[-14:] if len(complete_candles) >= 14 else complete_candles
-            latest_rsi_values = rsi_values[-14:] if rsi_values and len(rsi_values) >= 14 else rsi_values if rsi_values else [None] * len(latest_candles)
+            # rsi_values is index-aligned with complete_candles, so no separate RSI slice is needed
+            rsi_offset = max(len(complete_candles) - 14, 0)
+            latest_candles = complete_candles[rsi_offset:]
             
             logger.info(f"📊 Filtered latest {len(latest_candles)} candles")
             
@@ -1314,23 +1573,24 @@ class KiteDataFetcher:
                     newest_candle_date = newest_candle_date.strftime('%Y-%m-%d %H:%M')
                 logger.info(f"📅 Data range: {oldest_candle_date} to {newest_candle_date}")
             
-            # Convert datetime objects to ISO format and add RSI values
+            # Convert datetime objects to ISO format and add RSI values, in place in one pass
             logger.info("Processing candle data with RSI...")
-            processed_candles = []
-            for idx, candle in enumerate(latest_candles):
+            processed_candles = latest_candles
+            debug_enabled = logger.isEnabledFor(logging.DEBUG)  # skip building per-candle debug strings at INFO
+            for idx, candle in enumerate(processed_candles):
                 # Convert date to ISO format string
                 if isinstance(candle.get('date'), datetime):
                     candle['date'] = candle['date'].isoformat()
                 
                 # Add RSI value
-                rsi_val = latest_rsi_values[idx] if idx < len(latest_rsi_values) else None
+                rsi_val = rsi_values[rsi_offset + idx] if rsi_values else None
                 candle['rsi'] = round(rsi_val, 2) if rsi_val is not None else None
                 
-                processed_candles.append(candle)
-                logger.debug(f"Candle {idx+1}: Date={candle.get('date')}, "
-                           f"O={candle.get('open')}, H={candle.get('high')}, "
-                           f"L={candle.get('low')}, C={candle.get('close')}, "
-                           f"RSI={candle.get('rsi')}")
+                if debug_enabled:
+                    logger.debug(f"Candle {idx+1}: Date={candle.get('date')}, "
+                               f"O={candle.get('open')}, H={candle.get('high')}, "
+                               f"L={candle.get('low')}, C={candle.get('close')}, "
+                               f"RSI={candle.get('rsi')}")
             
             # Check for order conditions on latest candle
             if latest_rsi and processed_candles:
@@ -1340,12 +1600,20 @@ class KiteDataFetcher:
                 self.check_and_place_order(latest_candle, latest_rsi)
             
             # Save to JSON file - just the array of candles
+            # Serialize once and write the whole payload in one go, atomically
+            # (temp file + rename) so a crash mid-write can't truncate the snapshot
             logger.info(f"Saving {len(processed_candles)} candles to {self.candles_data_file}...")
-            with open(self.candles_data_file, 'w') as f:
-                json.dump(processed_candles, f, indent=2)
-            
-            logger.info(f"✓ Successfully saved {len(processed_candles)} candles to {self.candles_data_file}")
-            logger.info(f"File size: {os.path.getsize(self.candles_data_file)} bytes")
+            payload = dumps_json(processed_candles)
+            payload_hash = hashlib.blake2b(payload, digest_size=8).digest()
+            if payload_hash == self.last_candles_hash and os.path.exists(self.candles_data_file):
+                # Same candles as last cycle (e.g. outside market hours) - skip the redundant write
+                logger.info(f"⏭️  Candle data unchanged, skipping write to {self.candles_data_file}")
+            else:
+                write_file_atomic(self.candles_data_file, payload)
+                self.last_candles_hash = payload_hash
+                
+                logger.info(f"✓ Successfully saved {len(processed_candles)} candles to {self.candles_data_file}")
+                logger.info(f"File size: {len(payload)} bytes")
             
             # Log summary of latest candle
             if processed_candles:
@@ -1383,13 +1651,21 @@ class KiteDataFetcher:
         if connection_success:
             wait_time = self.calculate_next_5min_interval()
             logger.info(f"⏳ Waiting for next 5-minute interval before first fetch...")
-            time.sleep(wait_time)
+            self.shutdown_event.wait(wait_time)
         
-        while True:
+        while not self.shutdown_event.is_set():
             # If not connected, try to reconnect
             if not connection_success or not self.is_connected:
-                logger.warning(f"⚠ Not connected. Retrying in {self.retry_interval} seconds...")
-                time.sleep(self.retry_interval)
+                # Equal-jitter exponential backoff: half of min(retry_interval, base * 2^attempt) plus a
+                # random share of the other half, so retries (each rebuilds the KiteTicker) never fire
+                # back-to-back and repeated failures back off to 150-300s
+                backoff = min(self.retry_interval, self.retry_base_delay * 2 ** self.retry_attempt)
+                retry_delay = backoff / 2 + random.uniform(0, backoff / 2)
+                self.retry_attempt = min(self.retry_attempt + 1, 10)
+                logger.warning(f"⚠ Not connected. Retrying in {retry_delay:.1f} seconds (attempt {self.retry_attempt})...")
+                # Interruptible wait - SIGTERM ends the retry loop immediately instead of after the delay
+                if self.shutdown_event.wait(retry_delay):
+                    break
                 
                 # Check for config changes BEFORE reconnection attempt
                 # This allows updating config even when stuck in retry loop
@@ -1402,9 +1678,11 @@ class KiteDataFetcher:
                 
                 # If reconnection successful, wait for next 5-minute interval
                 if connection_success:
+                    self.retry_attempt = 0
                     wait_time = self.calculate_next_5min_interval()
                     logger.info(f"⏳ Reconnected! Waiting for next 5-minute interval before fetching...")
-                    time.sleep(wait_time)
+                    if self.shutdown_event.wait(wait_time):
+                        break
                 else:
                     continue
             
@@ -1444,17 +1722,32 @@ class KiteDataFetcher:
             if config_was_changed:
                 self.reset_config_change_flag()
             
+            # Report tick queue backpressure since last cycle
+            if self.dropped_ticks:
+                logger.warning(f"⚠ Tick queue backpressure: dropped {self.dropped_ticks} tick(s), queue depth {self.tick_queue.qsize()}")
+                self.dropped_ticks = 0
+            
             logger.info("="*80)
             
             # Wait until next 5-minute interval (e.g., 9:15, 9:20, 9:25, etc.)
             wait_time = self.calculate_next_5min_interval()
-            time.sleep(wait_time)
+            self.shutdown_event.wait(wait_time)
+        
+        logger.info("="*80)
+        logger.info("Server stopped (shutdown requested)")
+        logger.info("="*80)
+    
+    def request_shutdown(self, signum=None, frame=None):
+        """Signal handler: wake the main loop so it exits instead of sleeping out the interval"""
+        logger.info(f"🛑 Shutdown requested (signal {signum})")
+        self.shutdown_event.set()
 
 
 def main():
     """Entry point for the server"""
     try:
         fetcher = KiteDataFetcher()
+        signal.signal(signal.SIGTERM, fetcher.request_shutdown)
         fetcher.run()
     except KeyboardInterrupt:
         logger.info("\n" + "="*80)